@@ -142,24 +142,57 @@ class ICMNet(nn.Module):
         self.current_feature = None
         self.next_feature = None
 
+        # Int8 copies of the forward and inverse heads, kept in a tuple so
+        # they are not registered as submodules and stay out of the state dict
+        self._quantized_heads = None
+        self._quantized_version = None
+
     def forward(self, current_states, next_states):
         """Encode the states"""
         self.current_feature = self.feat_enc_net(current_states)
         self.next_feature = self.feat_enc_net(next_states)
         return None
 
+    def heads(self):
+        """
+        Forward and inverse heads to use for the current call.
+
+        Inference only calls on CPU, such as computing the exploration rewards
+        on the rollout workers, use dynamically quantized int8 copies of the
+        heads. These are requantized whenever the weights have been updated.
+        :return: (forward net, inverse net)
+        """
+        weight = self.fwd_net.fc1.weight
+        if (torch.is_grad_enabled() or weight.device.type != 'cpu'
+                or torch.backends.quantized.engine == 'none'):
+            return self.fwd_net, self.inv_net
+
+        # In place weight updates from the optimizer or load_state_dict bump
+        # the version counters of the parameters
+        version = tuple(p._version for p in self.fwd_net.parameters()) \
+            + tuple(p._version for p in self.inv_net.parameters())
+        if self._quantized_heads is None or self._quantized_version != version:
+            self._quantized_heads = (
+                torch.quantization.quantize_dynamic(self.fwd_net, {nn.Linear}, dtype=torch.qint8),
+                torch.quantization.quantize_dynamic(self.inv_net, {nn.Linear}, dtype=torch.qint8),
+            )
+            self._quantized_version = version
+        return self._quantized_heads
+
     def fwd_forward(self, action):
         action_one_hot = torch.zeros(action.shape[0], self.num_actions, device=self.fwd_net.fc1.weight.device) \
             .scatter_(1, action.long().view(-1, 1), 1)
         fwd_in = torch.cat((self.current_feature, action_one_hot), 1)
-        next_feature_pred = self.fwd_net(fwd_in)
+        fwd_net, _ = self.heads()
+        next_feature_pred = fwd_net(fwd_in)
 
         loss_fwd = 0.5 * F.mse_loss(next_feature_pred, self.next_feature, reduction='none').mean(dim=-1)
         return loss_fwd
 
     def inv_forward(self, action):
         inv_in = torch.cat((self.current_feature, self.next_feature), 1)
-        action_pred = self.inv_net(inv_in)
+        _, inv_net = self.heads()
+        action_pred = inv_net(inv_in)
 
         loss_inv = F.cross_entropy(action_pred.view(-1, self.num_actions), action.long(), reduction='none')
         return loss_inv
@@ -1,3 +1,5 @@
+from typing import Tuple
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -7,6 +9,48 @@ from ray.rllib.utils.annotations import override
 
 from exploration.icm import ICMNet
 
+@torch.jit.script
+def lstm_cell(x_gates: torch.Tensor, hx: torch.Tensor, cx: torch.Tensor,
+              w_hh: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Single LSTM step given the precomputed input projection (with biases).
+    """
+    gates = x_gates + torch.mm(hx, w_hh.t())
+    ingate, forgetgate, cellgate, outgate = gates.chunk(4, 1)
+
+    ingate = torch.sigmoid(ingate)
+    forgetgate = torch.sigmoid(forgetgate)
+    cellgate = torch.tanh(cellgate)
+    outgate = torch.sigmoid(outgate)
+
+    cy = (forgetgate * cx) + (ingate * cellgate)
+    hy = outgate * torch.tanh(cy)
+    return hy, cy
+
+@torch.jit.script
+def lstm_layer(inputs: torch.Tensor, hx: torch.Tensor, cx: torch.Tensor,
+               w_ih: torch.Tensor, w_hh: torch.Tensor,
+               b_ih: torch.Tensor, b_hh: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Batch first single layer LSTM using the same weight layout as nn.LSTM.
+    """
+    # Project every timestep through the input weights in a single matmul
+    x_gates = torch.matmul(inputs, w_ih.t()) + (b_ih + b_hh)
+    outputs = []
+    for t in range(inputs.size(1)):
+        hx, cx = lstm_cell(x_gates[:, t], hx, cx, w_hh)
+        outputs.append(hx)
+    return torch.stack(outputs, 1), hx, cx
+
+def to_channels_last(obs):
+    """
+    Converts a NHWC observation batch to a float NCHW view.
+
+    The permuted view is already laid out as channels last so the convolutions
+    can consume it without another copy.
+    """
+    return obs.float().permute(0, 3, 1, 2).contiguous(memory_format=torch.channels_last)
+
 class SmallConvNet(nn.Module):
     """
     Small PyTorch CNN.
@@ -18,7 +62,7 @@ class SmallConvNet(nn.Module):
         self.conv3 = nn.Conv2d(32, 32, 3, 2, 1)
         self.conv4 = nn.Conv2d(32, 32, 3, 2, 1)
 
-    def forward(self, x):
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
         x = F.leaky_relu(self.conv1(x))
         x = F.leaky_relu(self.conv2(x))
         x = F.leaky_relu(self.conv3(x))
@@ -34,19 +78,47 @@ class SmallConvLSTMModel(RecurrentNetwork, nn.Module):
         RecurrentNetwork.__init__(self, obs_space, action_space, num_outputs, model_config, name)
         nn.Module.__init__(self)
 
-        self.convnet = SmallConvNet()
+        # Script the CNN so the conv + leaky_relu stages run as a single
+        # graph without per-layer Python dispatch on every rollout step.
+        # The scripted module shares its parameters with the eager one, which
+        # is kept in a tuple so it is not registered twice and can later be
+        # swapped in by compile_convnet.
+        # Observations arrive as NHWC so keep the convolutions channels last.
+        convnet = SmallConvNet().to(memory_format=torch.channels_last)
+        self._eager_convnet = (convnet,)
+        self.convnet = torch.jit.script(convnet)
         self.conv_features = None
+        # Only used to hold the weights, forward_rnn runs them through the
+        # scripted lstm_layer which avoids the cuDNN call overhead on the
+        # short sequences seen during rollouts
         self.lstm = nn.LSTM(288, 256, batch_first=True)
         self.lstm.bias_ih_l0.data[256:256 * 2].fill_(1)
         self.lstm_features = None
+        # Zero recurrent state cloned by get_initial_state on every env reset,
+        # kept out of the state dict so checkpoints are unchanged
+        self.register_buffer('_lstm_hidden_zero', torch.zeros(256), persistent=False)
         self.action_branch = nn.Linear(256, num_outputs)
         self.value_branch = nn.Linear(256, 1)
 
         self.icm_net = ICMNet(4, num_outputs, in_size=288, feat_size=256)
+        self.icm_net = self.icm_net.to(memory_format=torch.channels_last)
+
+    def compile_convnet(self):
+        """
+        Replaces the scripted CNN with a torch.compile'd one where available.
+
+        Only worth it for the GPU learner, CPU rollout workers stay on the
+        scripted CNN. Parameters and their names are unchanged so the
+        optimizer, checkpoints and weight syncs are unaffected.
+        """
+        convnet, = self._eager_convnet
+        if hasattr(convnet, 'compile'):
+            convnet.compile(fullgraph=True)
+            self.convnet = convnet
 
     @override(RecurrentNetwork)
     def forward(self, input_dict, state, seq_lens):
-        x = input_dict['obs'].float().permute(0, 3, 1, 2)
+        x = to_channels_last(input_dict['obs'])
         self.conv_features = self.convnet(x)
 
         input_dict["obs_flat"] = self.conv_features
@@ -54,12 +126,13 @@ class SmallConvLSTMModel(RecurrentNetwork, nn.Module):
 
     @override(RecurrentNetwork)
     def forward_rnn(self, inputs, state, seq_lens):
-        self.lstm_features, [h, c] = self.lstm(inputs,
-            [torch.unsqueeze(state[0], 0),
-             torch.unsqueeze(state[1], 0)])
+        self.lstm_features, h, c = lstm_layer(
+            inputs, state[0], state[1],
+            self.lstm.weight_ih_l0, self.lstm.weight_hh_l0,
+            self.lstm.bias_ih_l0, self.lstm.bias_hh_l0)
 
         action_out = self.action_branch(self.lstm_features)
-        return action_out, [torch.squeeze(h, 0), torch.squeeze(c, 0)]
+        return action_out, [h, c]
 
     @override(ModelV2)
     def value_function(self):
@@ -70,16 +143,43 @@ class SmallConvLSTMModel(RecurrentNetwork, nn.Module):
     @override(ModelV2)
     def get_initial_state(self):
         h = [
-            self.action_branch.weight.new(1, 256).zero_().squeeze(0),
-            self.action_branch.weight.new(1, 256).zero_().squeeze(0),
+            self._lstm_hidden_zero.clone(),
+            self._lstm_hidden_zero.clone(),
         ]
         return h
 
     def icm_forward(self, obs, next_obs):
-        return self.icm_net(obs.permute(0, 3, 1, 2).float(), next_obs.permute(0, 3, 1, 2).float())
+        return self.icm_net(to_channels_last(obs), to_channels_last(next_obs))
 
     def icm_fwd_forward(self, actions):
         return self.icm_net.fwd_forward(actions)
 
     def icm_inv_forward(self, actions):
         return self.icm_net.inv_forward(actions)
+
+class SmallConvLSTMTrunk(nn.Module):
+    """
+    Tensor only actor critic forward sharing the weights of a SmallConvLSTMModel.
+
+    Takes batch major padded [B, T, ...] inputs so that it can be captured as a
+    CUDA graph for fixed batch shapes.
+    """
+    def __init__(self, model):
+        super(SmallConvLSTMTrunk, self).__init__()
+        self.convnet = model.convnet
+        self.lstm = model.lstm
+        self.action_branch = model.action_branch
+        self.value_branch = model.value_branch
+
+    def forward(self, obs, h, c):
+        batch_size, seq_len = obs.shape[0], obs.shape[1]
+        x = to_channels_last(obs.reshape((batch_size * seq_len,) + obs.shape[2:]))
+        x = self.convnet(x).reshape(batch_size, seq_len, -1)
+        features, _, _ = lstm_layer(
+            x, h, c,
+            self.lstm.weight_ih_l0, self.lstm.weight_hh_l0,
+            self.lstm.bias_ih_l0, self.lstm.bias_hh_l0)
+
+        logits = self.action_branch(features).reshape(batch_size * seq_len, -1)
+        values = self.value_branch(features).reshape(-1)
+        return logits, values
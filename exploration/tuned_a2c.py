@@ -1,13 +1,20 @@
+import contextlib
+import inspect
+from typing import Optional, Tuple
+
+import numpy as np
 import torch
 from torch import nn
 from torch import optim
+import torch.nn.functional as F
 from ray.rllib.agents.a3c import A2CTrainer
 from ray.rllib.agents.a3c.a2c import A2C_DEFAULT_CONFIG
 from ray.rllib.agents.a3c.a3c_torch_policy import A3CTorchPolicy
 from ray.rllib.evaluation.postprocessing import compute_advantages, Postprocessing
+from ray.rllib.models.torch.torch_action_dist import TorchCategorical
 from ray.rllib.policy.sample_batch import SampleBatch
-from ray.rllib.utils.torch_ops import sequence_mask
 
+from exploration.small_lstm_model import SmallConvLSTMModel, SmallConvLSTMTrunk
 from optim.RMSpropLambdaLR import RMSpropLambdaLR
 from optim.RMSpropCyclicLR import RMSpropCyclicLR
 
@@ -36,11 +43,51 @@ TUNED_A2C_CONFIG = A2CTrainer.merge_trainer_configs(
         'grad_clip': 0.5,
         'epsilon': 1e-8,
 
+        # Capture the value bootstrap and recurrent training forwards as
+        # CUDA graphs when running on GPU
+        'use_cuda_graphs': True,
+
+        # Defer the value bootstrap of truncated trajectories to the learner
+        # and evaluate all of them in a single batched forward pass
+        'batched_bootstrap': True,
+
+        # Run the training forward passes under bfloat16 autocast on GPUs
+        # with native bfloat16 support
+        'bf16_autocast': True,
+
         '_use_trajectory_view_api': False,
     },
     _allow_unknown_configs=True,
 )
 
+def autocast(policy):
+    # Pre-Ampere GPUs reject or emulate bfloat16, so only use it where it
+    # is supported natively
+    if (policy.config['bf16_autocast'] and policy.device.type == 'cuda'
+            and hasattr(torch, 'autocast') and torch.cuda.is_bf16_supported()):
+        # Graphed callables require the autocast cache to be disabled
+        return torch.autocast('cuda', dtype=torch.bfloat16, cache_enabled=False)
+    return contextlib.nullcontext()
+
+# Non-recurrent batches have no padding and pass no mask at all
+@torch.jit.script
+def _masked_sum(x: torch.Tensor, mask: Optional[torch.Tensor]) -> torch.Tensor:
+    if mask is None:
+        return torch.sum(x)
+    return torch.sum(x * mask)
+
+# Masked entropy, policy and value losses computed in a single scripted
+# function so the elementwise products and reductions can be fused
+@torch.jit.script
+def _a2c_losses(entropy: torch.Tensor, logp: torch.Tensor, adv: torch.Tensor,
+                values: torch.Tensor, targets: torch.Tensor, mask: Optional[torch.Tensor],
+                bs: float) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    entropy_loss = -_masked_sum(entropy, mask) / bs
+    pi_err = -_masked_sum(adv * logp, mask) / bs
+    diff = values - targets
+    value_err = _masked_sum(diff * diff, mask) / bs
+    return entropy_loss, pi_err, value_err
+
 # Modify losses to average over batches instead of sum
 # Provides consistent behaviour when changing batch sizes
 # Fix loss to mask padded sequences when training with recurrent policies
@@ -48,39 +95,78 @@ def actor_critic_loss(policy, model, dist_class, train_batch):
     # If policy is recurrent, mask out padded sequences
     # and calculate batch size
     if policy.is_recurrent():
+        # Sequences are padded to the longest one in the batch so the padded
+        # length follows from the batch shape without a device to host sync
         seq_lens = train_batch['seq_lens']
-        max_seq_len = torch.max(seq_lens)
-        mask_orig = sequence_mask(seq_lens, max_seq_len)
-        mask = torch.reshape(mask_orig, [-1])
+        max_seq_len = train_batch[SampleBatch.REWARDS].shape[0] // seq_lens.shape[0]
+        mask = (policy._arange_buf[:max_seq_len] < seq_lens.unsqueeze(1)).reshape(-1)
         batch_size = seq_lens.shape[0] * max_seq_len
     else:
-        mask = torch.ones_like(train_batch[SampleBatch.REWARDS])
-        batch_size = mask.shape[0]
+        mask = None
+        batch_size = train_batch[SampleBatch.REWARDS].shape[0]
 
-    _ = model.icm_forward(
-        train_batch[SampleBatch.OBS],
-        train_batch[SampleBatch.NEXT_OBS]
-    )
-    icm_fwd_loss = model.icm_fwd_forward(train_batch[SampleBatch.ACTIONS])
-    icm_inv_loss = model.icm_inv_forward(train_batch[SampleBatch.ACTIONS])
-    icm_loss = 0.995 * icm_fwd_loss + 0.005 * icm_inv_loss
-    icm_loss = torch.sum(icm_loss * mask)
-    icm_loss /= batch_size
-    policy.icm_loss = icm_loss
-
-    logits, _ = model.from_batch(train_batch)
-    values = model.value_function()
-    dist = dist_class(logits, model)
-    log_probs = dist.logp(train_batch[SampleBatch.ACTIONS])
-    policy.entropy = -torch.sum(dist.entropy() * mask) / batch_size
-    policy.pi_err = -torch.sum(train_batch[Postprocessing.ADVANTAGES] * log_probs.reshape(-1) * mask) / batch_size
-    policy.value_err = torch.sum(torch.pow((values.reshape(-1) - train_batch[Postprocessing.VALUE_TARGETS]) * mask, 2.0)) / batch_size
+    advantages = train_batch[Postprocessing.ADVANTAGES]
+    value_targets = train_batch[Postprocessing.VALUE_TARGETS]
+    if policy.config['batched_bootstrap']:
+        bootstrap = bootstrap_returns(policy, train_batch)
+        advantages = advantages + bootstrap
+        if policy.config['use_critic']:
+            value_targets = value_targets + bootstrap
+
+    # Run the forward passes in bfloat16 on GPU, the reductions below are
+    # kept in float32
+    with autocast(policy):
+        _ = model.icm_forward(
+            train_batch[SampleBatch.OBS],
+            train_batch[SampleBatch.NEXT_OBS]
+        )
+        icm_fwd_loss = model.icm_fwd_forward(train_batch[SampleBatch.ACTIONS])
+        icm_inv_loss = model.icm_inv_forward(train_batch[SampleBatch.ACTIONS])
+        icm_loss = 0.995 * icm_fwd_loss + 0.005 * icm_inv_loss
+        icm_loss = _masked_sum(icm_loss.float(), mask) / batch_size
+        policy.icm_loss = icm_loss
+
+        graphed = policy._graphed_forward(train_batch) if policy.is_recurrent() else None
+        if graphed is not None:
+            logits, values = graphed
+        else:
+            # Same inputs as model.from_batch
+            input_dict = {'obs': train_batch[SampleBatch.CUR_OBS], 'is_training': True}
+            input_dict.update(
+                (k, train_batch[k]) for k in policy._prev_input_keys if k in train_batch)
+            logits, _ = model(
+                input_dict,
+                [train_batch[k] for k in policy._state_in_keys],
+                train_batch.get('seq_lens'))
+            values = model.value_function()
+        if dist_class is TorchCategorical:
+            # Share a single log softmax between the log probs and the entropy
+            # instead of normalising the logits twice
+            log_probs_all = F.log_softmax(logits, -1)
+            log_probs = log_probs_all.gather(
+                -1, train_batch[SampleBatch.ACTIONS].long().unsqueeze(-1)).squeeze(-1)
+            entropy = -torch.sum(log_probs_all.exp() * log_probs_all, -1)
+        else:
+            dist = dist_class(logits, model)
+            log_probs = dist.logp(train_batch[SampleBatch.ACTIONS])
+            entropy = dist.entropy()
+    policy.entropy, policy.pi_err, policy.value_err = _a2c_losses(
+        entropy.float(),
+        log_probs.float().reshape(-1),
+        advantages,
+        values.float().reshape(-1),
+        value_targets,
+        mask,
+        float(batch_size))
     overall_err = sum([
         policy.pi_err,
         policy.config['vf_loss_coeff'] * policy.value_err,
         policy.config['entropy_coeff'] * policy.entropy,
         icm_loss
     ])
+    # Kept on device and copied to host once in stats
+    policy._loss_stats = torch.stack([
+        policy.entropy, policy.pi_err, policy.value_err, icm_loss]).detach()
     return overall_err
 
 # Fix estimation of final reward using value function to use internal recurrent
@@ -89,42 +175,247 @@ def add_advantages(policy,
                    sample_batch,
                    other_agent_batches=None,
                    episode=None):
+    # as_tensor reuses the numpy buffers where the dtype already matches
     _ = policy.model.icm_forward(
-        torch.Tensor(sample_batch[SampleBatch.OBS]),
-        torch.Tensor(sample_batch[SampleBatch.NEXT_OBS])
+        torch.as_tensor(sample_batch[SampleBatch.OBS], dtype=torch.float32, device=policy.device),
+        torch.as_tensor(sample_batch[SampleBatch.NEXT_OBS], dtype=torch.float32, device=policy.device)
     )
-    exploration_rewards = 0.005 * policy.model.icm_fwd_forward(torch.Tensor(sample_batch[SampleBatch.ACTIONS]))
-    exploration_rewards = exploration_rewards.numpy()
+    exploration_rewards = 0.005 * policy.model.icm_fwd_forward(
+        torch.as_tensor(sample_batch[SampleBatch.ACTIONS], device=policy.device))
+    exploration_rewards = exploration_rewards.cpu().numpy()
     sample_batch[SampleBatch.REWARDS] += exploration_rewards
     sample_batch['exploration_rewards'] = exploration_rewards
 
     completed = sample_batch[SampleBatch.DONES][-1]
-    if completed:
+    if completed or policy.config['batched_bootstrap']:
         last_r = 0.0
     else:
         # Trajectory has been truncated, estimate final reward using the
         # value function from the terminal observation and
         # internal recurrent state if any
-        next_state = []
-        for i in range(policy.num_state_tensors()):
-            next_state.append(sample_batch['state_out_{}'.format(i)][-1])
+        next_state = tuple(sample_batch[k][-1] for k in policy._state_out_keys)
         last_r = policy._value(sample_batch[SampleBatch.NEXT_OBS][-1],
                                sample_batch[SampleBatch.ACTIONS][-1],
                                sample_batch[SampleBatch.REWARDS][-1],
                                *next_state)
-    return compute_advantages(
+    batch = compute_advantages(
         sample_batch, last_r, policy.config['gamma'], policy.config['lambda'],
         policy.config['use_gae'], policy.config['use_critic'])
 
+    if policy.config['batched_bootstrap']:
+        # Returns are linear in last_r so record where the bootstrap value of
+        # a truncated trajectory has to be added, and with which discount
+        n = batch.count
+        bootstrap_end = np.zeros(n, dtype=np.float32)
+        bootstrap_discount = np.zeros(n, dtype=np.float32)
+        if not completed:
+            gamma = policy.config['gamma']
+            bootstrap_end[-1] = 1.
+            if policy.config['use_gae']:
+                decay = gamma * policy.config['lambda']
+                bootstrap_discount[:] = gamma * decay ** np.arange(n - 1, -1, -1)
+            else:
+                bootstrap_discount[:] = gamma ** np.arange(n, 0, -1)
+        batch['bootstrap_end'] = bootstrap_end
+        batch['bootstrap_discount'] = bootstrap_discount
+        # The tail recurrent state is copied into its own columns, since
+        # unlike the state_out columns these are padded along with the rest
+        # of the batch for recurrent training
+        for state_key, bootstrap_key in zip(policy._state_out_keys, policy._bootstrap_state_keys):
+            bootstrap_state = np.zeros_like(batch[state_key])
+            if not completed:
+                bootstrap_state[-1] = batch[state_key][-1]
+            batch[bootstrap_key] = bootstrap_state
+    return batch
+
+# Bootstrap values of every truncated trajectory in the train batch, spread
+# over the timesteps of their trajectory
+def bootstrap_returns(policy, train_batch):
+    ends = train_batch['bootstrap_end']
+    tails = ends > 0
+    next_obs = train_batch[SampleBatch.NEXT_OBS][tails]
+    if next_obs.shape[0] == 0:
+        return torch.zeros_like(ends)
+
+    with torch.no_grad():
+        last_r = policy._value_batched(
+            next_obs,
+            train_batch[SampleBatch.ACTIONS][tails],
+            train_batch[SampleBatch.REWARDS][tails],
+            *[train_batch[k][tails] for k in policy._bootstrap_state_keys])
+
+    # Trajectories are stored contiguously and end on their tail, so the
+    # number of tails before a timestep indexes the bootstrap value it uses
+    traj_index = (torch.cumsum(ends, 0) - ends).long().clamp(max=last_r.shape[0] - 1)
+    return train_batch['bootstrap_discount'] * last_r[traj_index]
+
 # Fix value network mixin to use internal recurrent state if any
+# On GPU the batch size 1 bootstrap forward is captured once as a CUDA graph
+# and replayed, since it is dominated by kernel launch overhead
 class ValueNetworkMixin:
     def _value(self, obs, prev_action, prev_reward, *state):
+        if getattr(self, '_vn_obs_buf', None) is None:
+            self._init_value_buffers(obs, prev_action, prev_reward, *state)
+
+        # Copy into the preallocated buffers instead of allocating and
+        # transferring new tensors on every bootstrap
+        self._vn_obs_buf.copy_(torch.as_tensor(obs), non_blocking=True)
+        self._vn_pa_buf.copy_(torch.as_tensor(prev_action), non_blocking=True)
+        self._vn_pr_buf.copy_(torch.as_tensor(prev_reward), non_blocking=True)
+        for buf, s in zip(self._vn_state_bufs, state):
+            buf.copy_(torch.as_tensor(s), non_blocking=True)
+
+        if (self.config['use_cuda_graphs'] and self.device.type == 'cuda'
+                and hasattr(torch.cuda, 'CUDAGraph')):
+            if getattr(self, '_vn_graph', None) is None:
+                self._capture_value_graph()
+            self._vn_graph.replay()
+            # Replays overwrite the output buffer so hand back a python float
+            return self._vn_value_out[0].item()
+
+        return self._value_forward()[0]
+
+    def _value_batched(self, obs, prev_action, prev_reward, *state):
         _ = self.model({
-            SampleBatch.CUR_OBS: torch.Tensor([obs]).to(self.device),
-            SampleBatch.PREV_ACTIONS: torch.Tensor([prev_action]).to(self.device),
-            SampleBatch.PREV_REWARDS: torch.Tensor([prev_reward]).to(self.device),
-        }, [torch.Tensor([s]).to(self.device) for s in state], torch.Tensor([1]).to(self.device))
-        return self.model.value_function()[0]
+            SampleBatch.CUR_OBS: obs,
+            SampleBatch.PREV_ACTIONS: prev_action,
+            SampleBatch.PREV_REWARDS: prev_reward,
+        }, list(state), torch.ones(obs.shape[0], device=obs.device))
+        return self.model.value_function()
+
+    def _init_value_buffers(self, obs, prev_action, prev_reward, *state):
+        # Persistent single sample input buffers, these are also the
+        # addresses the captured CUDA graph reads from on every replay
+        def buffer(x):
+            return torch.zeros((1,) + torch.as_tensor(x).shape, device=self.device)
+
+        self._vn_obs_buf = buffer(obs)
+        self._vn_pa_buf = buffer(prev_action)
+        self._vn_pr_buf = buffer(prev_reward)
+        self._vn_state_bufs = [buffer(s) for s in state]
+        self._vn_seq_lens = torch.ones(1, device=self.device)
+
+    def _value_forward(self):
+        _ = self.model({
+            SampleBatch.CUR_OBS: self._vn_obs_buf,
+            SampleBatch.PREV_ACTIONS: self._vn_pa_buf,
+            SampleBatch.PREV_REWARDS: self._vn_pr_buf,
+        }, self._vn_state_bufs, self._vn_seq_lens)
+        return self.model.value_function()
+
+    def _capture_value_graph(self):
+        # Weight updates are copied into the existing parameter storages so
+        # the captured graph always sees the latest weights.
+        # Warm up on a side stream so cuBLAS/cuDNN workspaces are allocated
+        # before capture
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.no_grad(), torch.cuda.stream(stream):
+            for _ in range(3):
+                self._value_forward()
+        torch.cuda.current_stream().wait_stream(stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.no_grad(), torch.cuda.graph(graph):
+            self._vn_value_out = self._value_forward()
+        self._vn_graph = graph
+
+# Replay the recurrent training forward from CUDA graphs captured for a fixed
+# set of batch sizes, padding each batch up to the nearest captured size
+class TrainGraphMixin:
+    def __init__(self):
+        self._train_graphs = {}
+        self._train_graph_sizes = []
+        if (self.config['use_cuda_graphs'] and self.device.type == 'cuda'
+                and hasattr(torch.cuda, 'make_graphed_callables')
+                and isinstance(self.model, SmallConvLSTMModel)):
+            # Batch sizes count sequences. A full train batch has at least
+            # train_steps / max_seq_len of them, plus one more for every
+            # episode that ends mid fragment, so buckets start there rounded
+            # up to a multiple of 8 and cover up to 128 extra sequences.
+            # Smaller batches, such as the dummy batch at init, run eagerly
+            # instead of holding on to a graph that is never replayed.
+            num_workers = max(self.config['num_workers'], 1)
+            train_steps = max(
+                self.config['train_batch_size'],
+                num_workers
+                * self.config['num_envs_per_worker']
+                * self.config['rollout_fragment_length'])
+            max_seq_len = self.config['model']['max_seq_len']
+            min_seqs = -(-train_steps // max_seq_len)
+            self._min_graph_size = min_seqs
+            first = -(-min_seqs // 8) * 8
+            self._train_graph_sizes = [first + 8 * i for i in range(17)]
+            # Activations of every bucket are captured into one shared
+            # memory pool rather than a private pool per graph
+            self._train_graph_kwargs = {}
+            if 'pool' in inspect.signature(torch.cuda.make_graphed_callables).parameters:
+                self._train_graph_kwargs['pool'] = torch.cuda.graph_pool_handle()
+
+    def _graphed_forward(self, train_batch):
+        seq_lens = train_batch['seq_lens']
+        batch_size = seq_lens.shape[0]
+        if not self._train_graph_sizes or batch_size < self._min_graph_size:
+            return None
+        bucket = next((b for b in self._train_graph_sizes if b >= batch_size), None)
+        if bucket is None:
+            return None
+
+        obs = train_batch[SampleBatch.OBS]
+        seq_len = obs.shape[0] // batch_size
+        max_seq_len = self.config['model']['max_seq_len']
+        if seq_len > max_seq_len:
+            return None
+
+        graphed = self._train_graphs.get(bucket)
+        if graphed is None:
+            # Weights are updated in place by the optimizer and set_weights
+            # so captured graphs stay valid for the whole run
+            sample_obs = obs.new_zeros((bucket, max_seq_len) + obs.shape[1:])
+            sample_state = [
+                train_batch['state_in_{}'.format(i)].new_zeros((bucket,) + train_batch['state_in_{}'.format(i)].shape[1:])
+                for i in range(self.num_state_tensors())]
+            # make_graphed_callables replaces the forward of the module it is
+            # given, so every bucket needs its own trunk. Trunks only share
+            # the weights of the model so this is cheap.
+            graphed = torch.cuda.make_graphed_callables(
+                SmallConvLSTMTrunk(self.model), (sample_obs, *sample_state),
+                **self._train_graph_kwargs)
+            self._train_graphs[bucket] = graphed
+
+        # Zero padded rows and timesteps are sliced off the outputs again so
+        # they do not contribute to the loss or the gradients
+        padded_obs = obs.new_zeros((bucket, max_seq_len) + obs.shape[1:])
+        padded_obs[:batch_size, :seq_len] = obs.reshape((batch_size, seq_len) + obs.shape[1:])
+        padded_state = []
+        for i in range(self.num_state_tensors()):
+            s = train_batch['state_in_{}'.format(i)]
+            padded_s = s.new_zeros((bucket,) + s.shape[1:])
+            padded_s[:batch_size] = s
+            padded_state.append(padded_s)
+
+        logits, values = graphed(padded_obs, *padded_state)
+        logits = logits.reshape(bucket, max_seq_len, -1)[:batch_size, :seq_len]
+        values = values.reshape(bucket, max_seq_len)[:batch_size, :seq_len]
+        return logits.reshape(batch_size * seq_len, -1), values.reshape(-1)
+
+def setup_mixins(policy, obs_space, action_space, config):
+    # Compile the CNN once the model is on its device, before the graphed
+    # trunk picks it up
+    if policy.device.type == 'cuda' and isinstance(policy.model, SmallConvLSTMModel):
+        policy.model.compile_convnet()
+    TrainGraphMixin.__init__(policy)
+    # Sample batch keys of the recurrent state outputs used when bootstrapping
+    policy._state_out_keys = tuple(
+        'state_out_{}'.format(i) for i in range(policy.num_state_tensors()))
+    policy._bootstrap_state_keys = tuple(
+        'bootstrap_state_{}'.format(i) for i in range(policy.num_state_tensors()))
+    # Model inputs of the training forward, see ModelV2.from_batch
+    policy._state_in_keys = tuple(
+        'state_in_{}'.format(i) for i in range(policy.num_state_tensors()))
+    policy._prev_input_keys = (SampleBatch.PREV_ACTIONS, SampleBatch.PREV_REWARDS)
+    # Reused to build the sequence mask of every recurrent training batch
+    policy._arange_buf = torch.arange(config['model']['max_seq_len'], device=policy.device)
 
 def torch_optimizer(policy, config):
     optimizers = {}
@@ -134,13 +425,21 @@ def torch_optimizer(policy, config):
     optimizer = optimizers[config['lr_mode']]
     return optimizer(policy, config)
 
+# Use the multi tensor RMSprop step where available so a single vectorised
+# update is applied across all parameters
+def rmsprop_kwargs():
+    if 'foreach' in inspect.signature(optim.RMSprop.__init__).parameters:
+        return {'foreach': True}
+    return {}
+
 # Use RMSprop as per source paper
 # More consistent than ADAM in non-stationary problems such as RL
 def torch_rmsprop_optimizer(policy, config):
     return optim.RMSprop(
         policy.model.parameters(),
         lr=config['lr'],
-        eps=config['epsilon'])
+        eps=config['epsilon'],
+        **rmsprop_kwargs())
 
 # RMSprop with linear learning rate annealing
 def torch_rmsprop_lambdalr_optimizer(policy, config):
@@ -158,11 +457,16 @@ def torch_rmsprop_lambdalr_optimizer(policy, config):
     lr = float(config['lr'])
     end_lr = float(config['end_lr'])
 
+    # Learning rate multiplier falls linearly from 1 to end_lr / lr and is
+    # held there once annealing is done
+    slope = (1. - (end_lr / lr)) / anneal_steps
+
     return RMSpropLambdaLR(
         policy.model.parameters(),
         lr=config['lr'],
         eps=config['epsilon'],
-        lr_lambda=lambda x: 1. - ((1. - (end_lr / lr)) * (x / anneal_steps)))
+        lr_lambda=lambda x: 1. - slope * min(x, anneal_steps),
+        **rmsprop_kwargs())
 
 def torch_rmsprop_cyclic_lr_optimizer(policy, config):
     return RMSpropCyclicLR(
@@ -173,17 +477,22 @@ def torch_rmsprop_cyclic_lr_optimizer(policy, config):
         max_lr=config['cyclic_lr_max_lr'],
         step_size_up=config['cyclic_lr_step_size'],
         mode=config['cyclic_lr_mode'],
-        gamma=config['cyclic_lr_gamma'])
+        gamma=config['cyclic_lr_gamma'],
+        **rmsprop_kwargs())
 
 # Update stats function to include the current learning rate
+# Read all losses back with a single device to host copy
 def stats(policy, train_batch):
+    entropy, pi_err, value_err, icm_loss, exploration_rewards = torch.cat([
+        policy._loss_stats,
+        train_batch['exploration_rewards'].mean().float().reshape(1)]).tolist()
     return {
-        'policy_entropy': policy.entropy.item(),
-        'policy_loss': policy.pi_err.item(),
-        'vf_loss': policy.value_err.item(),
+        'policy_entropy': entropy,
+        'policy_loss': pi_err,
+        'vf_loss': value_err,
         'cur_lr': policy._optimizers[0].param_groups[0]['lr'],
-        'icm_loss': policy.icm_loss.item(),
-        'exploration_rewards': train_batch['exploration_rewards'].mean().item()
+        'icm_loss': icm_loss,
+        'exploration_rewards': exploration_rewards
     }
 
 def get_policy_class(config):
@@ -195,7 +504,8 @@ TunedA2CPolicy = A3CTorchPolicy.with_updates(
         loss_fn=actor_critic_loss,
         stats_fn=stats,
         postprocess_fn=add_advantages,
-        mixins=[ValueNetworkMixin],
+        after_init=setup_mixins,
+        mixins=[ValueNetworkMixin, TrainGraphMixin],
         optimizer_fn=torch_optimizer)
 
 TunedA2CTrainer = A2CTrainer.with_updates(
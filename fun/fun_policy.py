@@ -1,3 +1,5 @@
+import inspect
+
 import numpy as np
 import torch
 import torch.nn.functional as F
@@ -218,13 +220,21 @@ def torch_optimizer(policy, config):
     optimizer = optimizers[config['lr_mode']]
     return optimizer(policy, config)
 
+# Use the multi tensor RMSprop step where available so a single vectorised
+# update is applied across all parameters
+def rmsprop_kwargs():
+    if 'foreach' in inspect.signature(optim.RMSprop.__init__).parameters:
+        return {'foreach': True}
+    return {}
+
 # Use RMSprop as per source paper
 # More consistent than ADAM in non-stationary problems such as RL
 def torch_rmsprop_optimizer(policy, config):
     return optim.RMSprop(
         policy.model.parameters(),
         lr=config['lr'],
-        eps=config['epsilon'])
+        eps=config['epsilon'],
+        **rmsprop_kwargs())
 
 # RMSprop with linear learning rate annealing
 def torch_rmsprop_lambdalr_optimizer(policy, config):
@@ -242,11 +252,16 @@ def torch_rmsprop_lambdalr_optimizer(policy, config):
     lr = float(config['lr'])
     end_lr = float(config['end_lr'])
 
+    # Learning rate multiplier falls linearly from 1 to end_lr / lr and is
+    # held there once annealing is done
+    slope = (1. - (end_lr / lr)) / anneal_steps
+
     return RMSpropLambdaLR(
         policy.model.parameters(),
         lr=config['lr'],
         eps=config['epsilon'],
-        lr_lambda=lambda x: 1. - ((1. - (end_lr / lr)) * (x / anneal_steps)))
+        lr_lambda=lambda x: 1. - slope * min(x, anneal_steps),
+        **rmsprop_kwargs())
 
 def torch_rmsprop_cyclic_lr_optimizer(policy, config):
     return RMSpropCyclicLR(
@@ -257,7 +272,8 @@ def torch_rmsprop_cyclic_lr_optimizer(policy, config):
         max_lr=config['cyclic_lr_max_lr'],
         step_size_up=config['cyclic_lr_step_size'],
         mode=config['cyclic_lr_mode'],
-        gamma=config['cyclic_lr_gamma'])
+        gamma=config['cyclic_lr_gamma'],
+        **rmsprop_kwargs())
 
 # Update stats function to include the current learning rate
 def stats(policy, train_batch):
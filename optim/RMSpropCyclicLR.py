@@ -24,7 +24,8 @@ class RMSpropCyclicLR(optim.RMSprop):
             cycle_momentum=False,
             base_momentum=0.8,
             max_momentum=0.9,
-            last_epoch=-1):
+            last_epoch=-1,
+            **kwargs):
 
         super().__init__(
             params,
@@ -33,7 +34,8 @@ class RMSpropCyclicLR(optim.RMSprop):
             eps=eps,
             weight_decay=weight_decay,
             momentum=momentum,
-            centered=centered)
+            centered=centered,
+            **kwargs)
 
         if mode == 'exp_range':
             scale_fn = lambda x: gamma**(x)
@@ -16,7 +16,8 @@ class RMSpropLambdaLR(optim.RMSprop):
             momentum=0,
             centered=False,
             lr_lambda=lambda x: x,
-            last_epoch=-1):
+            last_epoch=-1,
+            **kwargs):
 
         super().__init__(
             params,
@@ -25,7 +26,8 @@ class RMSpropLambdaLR(optim.RMSprop):
             eps=eps,
             weight_decay=weight_decay,
             momentum=momentum,
-            centered=centered)
+            centered=centered,
+            **kwargs)
 
         self.cyclic_lr = optim.lr_scheduler.LambdaLR(
             self,
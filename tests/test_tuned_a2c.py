@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('ray')
+
+import copy
+
+from gym.spaces import Box, Discrete
+from ray.rllib.models import MODEL_DEFAULTS
+from ray.rllib.policy.sample_batch import SampleBatch
+
+from exploration.small_lstm_model import SmallConvLSTMModel
+from exploration.tuned_a2c import TrainGraphMixin, bootstrap_returns
+
+def pad(rows, width):
+    return rows + [0.] * (width - len(rows))
+
+def test_bootstrap_returns_padded_recurrent_batch():
+    # Three trajectories padded to sequences of length 4:
+    # A truncated after 3 steps, B done after 5 steps, C truncated after 2 steps
+    ends = pad([0., 0., 1.], 4) + [0., 0., 0., 0.] + pad([0.], 4) + pad([0., 1.], 4)
+    discounts = pad([.3, .2, .1], 4) + [0.] * 8 + pad([.5, .4], 4)
+    state_a, state_c = 2., 5.
+    state = pad([0., 0., state_a], 4) + [0.] * 8 + pad([0., state_c], 4)
+    train_batch = {
+        'bootstrap_end': torch.tensor(ends),
+        'bootstrap_discount': torch.tensor(discounts),
+        SampleBatch.NEXT_OBS: torch.zeros(len(ends), 3),
+        SampleBatch.ACTIONS: torch.zeros(len(ends)),
+        SampleBatch.REWARDS: torch.zeros(len(ends)),
+        'bootstrap_state_0': torch.tensor(state).unsqueeze(1).repeat(1, 256),
+    }
+
+    # Value of a tail is the first entry of its recurrent state
+    def value_batched(obs, prev_action, prev_reward, *states):
+        assert obs.shape[0] == 2
+        return states[0][:, 0]
+
+    policy = SimpleNamespace(
+        _bootstrap_state_keys=('bootstrap_state_0',),
+        _value_batched=value_batched)
+
+    expected = torch.tensor(discounts) * torch.tensor(
+        [state_a] * 12 + [state_c] * 4)
+    assert torch.allclose(bootstrap_returns(policy, train_batch), expected)
+
+class GraphedPolicy(TrainGraphMixin):
+    """
+    Just enough of a policy to drive TrainGraphMixin.
+    """
+    def __init__(self, model, config):
+        self.model = model
+        self.config = config
+        self.device = torch.device('cuda')
+        TrainGraphMixin.__init__(self)
+
+    def num_state_tensors(self):
+        return 2
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason='requires CUDA')
+def test_graphed_forward_matches_eager_across_buckets():
+    torch.backends.cudnn.allow_tf32 = False
+    torch.backends.cuda.matmul.allow_tf32 = False
+    max_seq_len = 4
+    model_config = copy.deepcopy(MODEL_DEFAULTS)
+    model_config['max_seq_len'] = max_seq_len
+    model = SmallConvLSTMModel(
+        Box(0., 1., (42, 42, 4)), Discrete(6), 6, model_config, 'model').cuda()
+    policy = GraphedPolicy(model, {
+        'use_cuda_graphs': True,
+        'num_workers': 1,
+        'num_envs_per_worker': 1,
+        'rollout_fragment_length': 40,
+        'train_batch_size': 40,
+        'model': {'max_seq_len': max_seq_len},
+    })
+
+    # Two different sequence counts and padded lengths land in two buckets
+    for batch_size, seq_len in [(10, 4), (20, 3)]:
+        n = batch_size * seq_len
+        train_batch = {
+            'seq_lens': torch.full((batch_size,), seq_len, dtype=torch.int32, device='cuda'),
+            SampleBatch.OBS: torch.rand(n, 42, 42, 4, device='cuda'),
+            'state_in_0': torch.randn(batch_size, 256, device='cuda'),
+            'state_in_1': torch.randn(batch_size, 256, device='cuda'),
+        }
+        logits, values = policy._graphed_forward(train_batch)
+
+        eager_logits, _ = model(
+            {'obs': train_batch[SampleBatch.OBS], 'is_training': True},
+            [train_batch['state_in_0'], train_batch['state_in_1']],
+            train_batch['seq_lens'])
+        eager_values = model.value_function()
+
+        assert torch.allclose(logits, eager_logits, atol=1e-5)
+        assert torch.allclose(values, eager_values, atol=1e-5)
+
+    graphs = list(policy._train_graphs.values())
+    assert len(graphs) == 2 and graphs[0] is not graphs[1]